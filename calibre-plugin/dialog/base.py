@@ -9,7 +9,7 @@
 #
 import json
 from collections import OrderedDict
-from functools import cmp_to_key, partial
+from functools import partial
 from typing import Dict, List, Optional
 
 from calibre import prepare_string_for_xml
@@ -732,11 +732,7 @@ class BaseDialogMixin(QDialog):
                 library = model.get_library(model.get_website_id(_card))
                 site["__library"] = library
                 available_sites.append(site)
-        return sorted(
-            available_sites,
-            key=cmp_to_key(OverDriveClient.sort_availabilities),
-            reverse=True,
-        )
+        return sorted(available_sites, key=OverDriveClient.availability_sort_key)
 
 
 class BookPreviewDialog(QDialog):
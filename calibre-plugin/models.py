@@ -8,7 +8,6 @@
 # information
 #
 from collections import namedtuple
-from functools import cmp_to_key
 from typing import Dict, List, Optional
 
 from calibre.gui2 import elided_text
@@ -1044,9 +1043,7 @@ class LibbySearchModel(LibbyModel):
             v["advantageKey"] = k
             available_sites.append(v)
         available_sites = sorted(
-            available_sites,
-            key=cmp_to_key(OverDriveClient.sort_availabilities),
-            reverse=True,
+            available_sites, key=OverDriveClient.availability_sort_key
         )
         if role == Qt.ToolTipRole:
             if col == 0:
@@ -8,29 +8,92 @@
 # information
 #
 
-import gzip
+import heapq
 import json
 import logging
-from dataclasses import dataclass, field
+import ssl
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from http.client import HTTPException
 from io import BytesIO
 from socket import error as SocketError, timeout as SocketTimeout
-from ssl import SSLError
-from typing import Dict, List, Optional, Union
+from threading import Lock
+from types import MappingProxyType
+from typing import Dict, List, Optional, Sequence, Tuple, Union
 from urllib.error import HTTPError, URLError
-from urllib.parse import urlencode, urljoin
-from urllib.request import Request, build_opener
+from urllib.parse import urlencode
+from urllib.request import HTTPSHandler, Request, build_opener
 
-from .common import pageable
+from .common import MAX_PAGEABLE, pageable
 from .errors import ClientConnectionError
 
+try:
+    import orjson
+
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+
+    _loads = orjson.loads
+except ImportError:
+    # orjson is not bundled with calibre, fallback to the stdlib json
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("ascii")
+
+    _loads = json.loads
+
+try:
+    # libdeflate is faster than zlib for whole-buffer decompression
+    from deflate import gzip_decompress as _gunzip
+except ImportError:
+
+    def _gunzip(data: bytes) -> bytes:
+        # 16 + MAX_WBITS: expect a gzip header and trailer
+        return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+try:
+    import urllib3
+    from urllib3.exceptions import HTTPError as PoolError
+except ImportError:
+    # urllib3 is not bundled with calibre, fallback to the urllib opener
+    urllib3 = None
+
+    class PoolError(Exception):  # type: ignore[no-redef]
+        pass
+
+
 USER_AGENT = (
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 11_1) AppleWebKit/605.1.15 (KHTML, like Gecko) "  # noqa
     "Version/14.0.2 Safari/605.1.15"
 )
 SITE_URL = "https://libbyapp.com"
-THUNDER_API_URL = "https://thunder.api.overdrive.com/v2/"
+THUNDER_API_HOST = "thunder.api.overdrive.com"
+THUNDER_API_ORIGIN = f"https://{THUNDER_API_HOST}"
+THUNDER_API_URL = f"{THUNDER_API_ORIGIN}/v2/"
+_THUNDER_API_ORIGIN_LEN = len(THUNDER_API_ORIGIN)
+# the urllib3 pool does not follow redirects when retries=False
+_REDIRECT_STATUSES = (301, 302, 303, 307, 308)
 CLIENT_ID = "dewey"
+_CLIENT_ID_QUERY = urlencode({"x-client-id": CLIENT_ID})
+
+
+@lru_cache(maxsize=None)
+def get_ssl_context(verify: bool = True) -> ssl.SSLContext:
+    """
+    Shared SSL context so that the trust store is only loaded once.
+
+    :param verify: If False, the server certificate and hostname are not verified
+    :return:
+    """
+    ssl_ctx = ssl.create_default_context()
+    if not verify:
+        ssl_ctx.check_hostname = False
+        ssl_ctx.verify_mode = ssl.CERT_NONE
+    return ssl_ctx
 
 
 class SearchSortBy:
@@ -40,13 +103,42 @@ class SearchSortBy:
     DATE_ADDED = "newlyadded"
 
 
+def _convert_bool(value: bool) -> str:
+    return str(value).lower()
+
+
+def _convert_to_csv(values: Sequence) -> str:
+    return ",".join(v.strip() if isinstance(v, str) else str(v) for v in values)
+
+
+def _convert_str(value) -> str:
+    return str(value).strip()
+
+
+# LibraryMediaSearchParams attribute, query parameter name, converter
+# Attributes with a falsy value are not included in the query
+_SEARCH_QUERY_FIELDS = (
+    ("sort_by", "sortBy", None),
+    ("formats", "format", _convert_to_csv),
+    ("show_only_available", "showOnlyAvailable", _convert_bool),
+    ("show_only_prelease", "showOnlyPrerelease", _convert_bool),
+    ("query", "query", _convert_str),
+    ("title", "title", _convert_str),
+    ("creator", "creator", _convert_str),
+    ("identifier", "identifier", _convert_str),
+    ("title_ids", "titleIds", _convert_to_csv),
+    ("media_type", "mediaTypes", None),
+    ("subject_id", "subject", None),
+)
+
+
 @dataclass
 class LibraryMediaSearchParams:
     query: str = ""
     title: str = ""
     creator: str = ""
     identifier: str = ""
-    formats: List[str] = field(default_factory=list)
+    formats: Sequence[str] = ()
     per_page: int = 20
     page: int = 1
     sort_by: str = SearchSortBy.RELEVANCE
@@ -54,7 +146,7 @@ class LibraryMediaSearchParams:
     show_only_prelease: bool = False
     media_type: str = ""
     subject_id: str = ""
-    title_ids: List[str] = field(default_factory=list)
+    title_ids: Sequence[str] = ()
 
     def is_empty(self) -> bool:
         return not (
@@ -69,41 +161,58 @@ class LibraryMediaSearchParams:
             or self.subject_id
         )
 
-    def convert_bool(self, value: bool):
-        return str(value).lower()
-
-    def convert_to_csv(self, values: List):
-        return ",".join([str(v).strip() for v in values])
-
     def to_dict(self) -> Dict:
         result = {"page": max(1, self.page or 0), "perPage": max(1, self.per_page or 0)}
-        if self.sort_by:
-            result["sortBy"] = self.sort_by
-        if self.formats:
-            result["format"] = self.convert_to_csv(self.formats)
+        for attr, key, convert in _SEARCH_QUERY_FIELDS:
+            value = getattr(self, attr)
+            if value:
+                result[key] = convert(value) if convert else value
         if self.show_only_available:
-            result["showOnlyAvailable"] = self.convert_bool(self.show_only_available)
-        elif self.show_only_prelease:
-            result["showOnlyPrerelease"] = self.convert_bool(self.show_only_prelease)
-        for a in ("query", "title", "creator", "identifier"):
-            v = getattr(self, a)
-            if v:
-                result[a] = str(v).strip()
-        if self.title_ids:
-            result["titleIds"] = ",".join(self.title_ids)
-        if self.media_type:
-            result["mediaTypes"] = self.media_type
-        if self.subject_id:
-            result["subject"] = self.subject_id
+            # showOnlyAvailable takes precedence over showOnlyPrerelease
+            result.pop("showOnlyPrerelease", None)
         return result
 
 
+class LazyHeaders(object):
+    """
+    Formats headers for logging only if the log record is emitted
+    """
+
+    __slots__ = ("headers",)
+
+    def __init__(self, headers) -> None:
+        self.headers = headers
+
+    def __str__(self) -> str:
+        return "\n".join(f"{k}: {v}" for k, v in self.headers.items())
+
+
+class PooledResponse(object):
+    """
+    Wraps a urllib3 response so that it can be handled like
+    the response returned by the urllib opener
+    """
+
+    def __init__(self, response, url: str) -> None:
+        self.code = response.status
+        self.url = url
+        self.headers = response.headers
+        self._response = response
+
+    def info(self):
+        return self.headers
+
+    def read(self) -> bytes:
+        return self._response.data
+
+
 class OverDriveClient(object):
     """
     A really simplified OverDrive Thunder API client
     """
 
     MAX_PER_PAGE = 24
+    HTTP_CACHE_CAPACITY = 100
 
     def __init__(
         self,
@@ -120,7 +229,43 @@ class OverDriveClient(object):
         self.max_retries = max_retries
         self.user_agent = kwargs.pop("user_agent", USER_AGENT)
         self.api_base = THUNDER_API_URL
-        self.opener = build_opener()
+        # these are copied instead of rebuilt for every request
+        self._default_headers = MappingProxyType(
+            {
+                "User-Agent": self.user_agent,
+                "Referer": SITE_URL + "/",
+                "Origin": SITE_URL,
+                "Accept-Encoding": "gzip",
+                "Cache-Control": "no-cache",
+                "Pragma": "no-cache",
+            }
+        )
+        self._default_query = MappingProxyType({"x-client-id": CLIENT_ID})
+        self._default_query_paged = MappingProxyType(
+            {"x-client-id": CLIENT_ID, "page": 1, "perPage": self.MAX_PER_PAGE}
+        )
+        verify_ssl = kwargs.pop("verify_ssl", True)
+        ssl_ctx = get_ssl_context(verify_ssl)
+        self.opener = build_opener(HTTPSHandler(context=ssl_ctx))
+        # all requests go to the same host, so reuse keep-alive connections if we can
+        self._pool = (
+            urllib3.HTTPSConnectionPool(
+                THUNDER_API_HOST,
+                maxsize=4,
+                block=False,
+                ssl_context=ssl_ctx,
+                cert_reqs=ssl_ctx.verify_mode,
+                assert_hostname=None if verify_ssl else False,
+            )
+            if urllib3
+            else None
+        )
+        # conditional GET cache of url: (etag, last_modified, response body)
+        self.http_cache_capacity = kwargs.pop(
+            "http_cache_capacity", self.HTTP_CACHE_CAPACITY
+        )
+        self._http_cache: OrderedDict = OrderedDict()
+        self._http_cache_lock = Lock()
 
     def default_headers(self) -> Dict:
         """
@@ -128,15 +273,7 @@ class OverDriveClient(object):
 
         :return:
         """
-        headers = {
-            "User-Agent": self.user_agent,
-            "Referer": SITE_URL + "/",
-            "Origin": SITE_URL,
-            "Accept-Encoding": "gzip",
-            "Cache-Control": "no-cache",
-            "Pragma": "no-cache",
-        }
-        return headers
+        return dict(self._default_headers)
 
     def default_query(self, paging: bool = False) -> Dict:
         """
@@ -144,10 +281,7 @@ class OverDriveClient(object):
 
         :return:
         """
-        query = {"x-client-id": CLIENT_ID}
-        if paging:
-            query.update({"page": 1, "perPage": self.MAX_PER_PAGE})  # type: ignore[dict-item]
-        return query
+        return dict(self._default_query_paged if paging else self._default_query)
 
     def _read_response(self, response, decode: bool = True) -> Union[bytes, str]:
         """
@@ -156,11 +290,9 @@ class OverDriveClient(object):
         :param response:
         :return:
         """
+        res = response.read()
         if response.info().get("Content-Encoding") == "gzip":
-            buf = BytesIO(response.read())
-            res = gzip.GzipFile(fileobj=buf).read()
-        else:
-            res = response.read()
+            res = _gunzip(res)
         if not decode:
             return res
 
@@ -168,6 +300,64 @@ class OverDriveClient(object):
         self.logger.debug("RES BODY: %s", decoded_res)
         return decoded_res
 
+    def _open(self, req: Request):
+        """
+        Send the request using a pooled connection if available, else the urllib opener.
+
+        :param req:
+        :return:
+        """
+        endpoint_url = req.full_url
+        if not (self._pool and endpoint_url.startswith(THUNDER_API_URL)):
+            return self.opener.open(req, timeout=self.timeout)
+
+        res = self._pool.urlopen(
+            req.get_method(),
+            endpoint_url[_THUNDER_API_ORIGIN_LEN:],
+            body=req.data,
+            headers=req.headers,
+            timeout=self.timeout,
+            retries=False,
+            decode_content=False,  # gzip is handled in _read_response()
+        )
+        response = PooledResponse(res, endpoint_url)
+        if response.code in _REDIRECT_STATUSES:
+            # let the urllib opener follow the redirect, possibly to another host
+            return self.opener.open(req, timeout=self.timeout)
+        if response.code >= 400:
+            raise HTTPError(
+                endpoint_url,
+                response.code,
+                res.reason,
+                response.headers,
+                BytesIO(res.data),
+            )
+        return response
+
+    def _get_cached_response(self, url: str) -> Optional[Tuple[str, str, bytes]]:
+        with self._http_cache_lock:
+            cached = self._http_cache.get(url)
+            if cached:
+                self._http_cache.move_to_end(url)
+            return cached
+
+    def _cache_response(self, url: str, response, response_content: bytes) -> None:
+        etag = response.headers.get("ETag") or ""
+        last_modified = response.headers.get("Last-Modified") or ""
+        with self._http_cache_lock:
+            if not (etag or last_modified):
+                # drop the stale entry so that it is not revalidated again
+                self._http_cache.pop(url, None)
+                return
+            self._http_cache[url] = (etag, last_modified, response_content)
+            self._http_cache.move_to_end(url)
+            if len(self._http_cache) > self.http_cache_capacity:
+                self._http_cache.popitem(last=False)
+
+    def clear_http_cache(self) -> None:
+        with self._http_cache_lock:
+            self._http_cache.clear()
+
     def send_request(
         self,
         endpoint: str,
@@ -177,11 +367,12 @@ class OverDriveClient(object):
         headers: Optional[Dict] = None,
         is_form: bool = True,
         decode_response: bool = True,
+        use_cache: bool = True,
     ):
         """
         Calls the private Libby api.
 
-        :param endpoint: Full endpoint url
+        :param endpoint: Endpoint path relative to the api base url, without a query string
         :param query: GET url query parameters
         :param params: POST parameters
         :param method: HTTP method name
@@ -191,22 +382,51 @@ class OverDriveClient(object):
                         If False, content-type is set to 'application/json'
                         and params are json-encoded in the request body.
         :param decode_response: If False, return raw bytes
+        :param use_cache: If False, do not make a conditional request with a cached response.
+                          Only GET json responses are cached.
         """
-        if not query:
-            query = {}
-        endpoint_url = urljoin(self.api_base, endpoint)
+        # all endpoints are relative paths without a query string,
+        # so we can skip urljoin() and the query separator check
+        endpoint_url = self.api_base + endpoint
+        is_default_headers = headers is None
         if headers is None:
             headers = self.default_headers()
         if query:
-            endpoint_url += ("?" if "?" not in endpoint else "&") + urlencode(
-                query, doseq=True
-            )
+            if query.get("x-client-id") == CLIENT_ID:
+                # most queries are default_query() with or without extra parameters
+                endpoint_url += "?" + _CLIENT_ID_QUERY
+                extra_query = {k: v for k, v in query.items() if k != "x-client-id"}
+                if extra_query:
+                    endpoint_url += "&" + urlencode(extra_query, doseq=True)
+            else:
+                endpoint_url += "?" + urlencode(query, doseq=True)
         if not method:
             # try to set an HTTP method
             if params is None:
                 method = "GET"
             else:
                 method = "POST"
+        method = method.upper()
+
+        cached = None
+        if (
+            use_cache
+            and decode_response
+            and self.http_cache_capacity
+            and method == "GET"
+        ):
+            cached = self._get_cached_response(endpoint_url)
+            if cached:
+                etag, last_modified, _ = cached
+                if not is_default_headers:
+                    # don't leak the conditional headers into the caller's dict
+                    headers = dict(headers)
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+        else:
+            use_cache = False
 
         data = None
         if params or params == "":
@@ -219,30 +439,24 @@ class OverDriveClient(object):
             elif is_form:
                 data = urlencode(params).encode("ascii")
             else:
-                data = json.dumps(params, separators=(",", ":")).encode("ascii")
+                data = _dumps(params)
 
         req = Request(endpoint_url, data, headers=headers)
-        if method:
-            req.get_method = (
-                lambda: method.upper()  # pylint: disable=unnecessary-lambda
-            )
+        req.get_method = lambda m=method: m  # type: ignore[misc]
 
         for attempt in range(0, self.max_retries + 1):
             try:
                 self.logger.debug("REQUEST: %s %s", req.get_method(), endpoint_url)
-                self.logger.debug(
-                    "REQ HEADERS: \n%s",
-                    "\n".join(["{}: {}".format(k, v) for k, v in req.headers.items()]),
-                )
+                self.logger.debug("REQ HEADERS: \n%s", LazyHeaders(req.headers))
                 if data:
                     self.logger.debug("REQ BODY: \n%s", data)
-                response = self.opener.open(req, timeout=self.timeout)
+                response = self._open(req)
             except HTTPError as e:
                 self.logger.debug("RESPONSE: %d %s", e.code, e.url)
-                self.logger.debug(
-                    "RES HEADERS: \n%s",
-                    "\n".join(["{}: {}".format(k, v) for k, v in e.info().items()]),
-                )
+                self.logger.debug("RES HEADERS: \n%s", LazyHeaders(e.info()))
+                if e.code == 304 and cached:
+                    # the urllib opener raises for 304 Not Modified
+                    return _loads(cached[2])
                 if (
                     attempt < self.max_retries and e.code >= 500
                 ):  # retry for server 5XX errors
@@ -250,17 +464,19 @@ class OverDriveClient(object):
                     self.logger.warning(
                         "Retrying due to %s: %s", e.__class__.__name__, str(e)
                     )
-                    self.logger.debug(self._read_response(e))
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug(self._read_response(e))
                     continue
                 raise
 
             except (
-                SSLError,
+                ssl.SSLError,
                 SocketTimeout,
                 SocketError,
                 URLError,  # URLError is base of HTTPError
                 HTTPException,
                 ConnectionError,
+                PoolError,
             ) as connection_error:
                 if attempt < self.max_retries:
                     # do nothing, try
@@ -277,22 +493,27 @@ class OverDriveClient(object):
                 ) from connection_error
 
             self.logger.debug("RESPONSE: %d %s", response.code, response.url)
-            self.logger.debug(
-                "RES HEADERS: \n%s",
-                "\n".join(["{}: {}".format(k, v) for k, v in response.info().items()]),
-            )
+            self.logger.debug("RES HEADERS: \n%s", LazyHeaders(response.info()))
+            if response.code == 304 and cached:
+                return _loads(cached[2])
             if not decode_response:
                 return self._read_response(response, decode_response)
 
-            response_content = self._read_response(response)
+            # keep the raw bytes so that json can be parsed without decoding to str first
+            response_content = self._read_response(response, decode=False)
             if not response_content.strip():
                 return {}
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("RES BODY: %s", response_content.decode("utf8"))
 
             if response.headers["content-type"].startswith("application/json"):
-                res_obj = json.loads(response_content)
+                res_obj = _loads(response_content)
+                if use_cache:
+                    # cache the body instead of res_obj because callers can modify it
+                    self._cache_response(endpoint_url, response, response_content)
                 return res_obj
 
-            return response_content
+            return response_content.decode("utf8")
 
     @staticmethod
     def library_title_permalink(library_key: str, title_id: str) -> str:
@@ -314,11 +535,14 @@ class OverDriveClient(object):
         :param rank:
         :return:
         """
-        covers: List[Dict] = sorted(
-            list(media.get("covers", []).values()),
-            key=lambda c: c.get("width", 0),
-            reverse=True,
-        )
+        covers_iter = (media.get("covers") or {}).values()
+        if rank >= 0:
+            covers: List[Dict] = heapq.nlargest(
+                rank + 1, covers_iter, key=lambda c: c.get("width", 0)
+            )
+        else:
+            # negative ranks count from the smallest cover
+            covers = sorted(covers_iter, key=lambda c: c.get("width", 0), reverse=True)
         try:
             cover_highest_res = covers[rank]
         except IndexError:
@@ -333,23 +557,10 @@ class OverDriveClient(object):
         :param formats:
         :return:
         """
-        for media_format in [
-            f
-            for f in formats
-            if [i for i in f.get("identifiers", []) if i["type"] == "ASIN"]
-        ]:
-            asin = next(
-                iter(
-                    [
-                        identifier["value"]
-                        for identifier in media_format.get("identifiers", [])
-                        if identifier["type"] == "ASIN"
-                    ]
-                ),
-                "",
-            )
-            if asin:
-                return asin
+        for media_format in formats:
+            for identifier in media_format.get("identifiers", []):
+                if identifier["type"] == "ASIN" and identifier.get("value"):
+                    return identifier["value"]
         return ""
 
     @staticmethod
@@ -365,43 +576,31 @@ class OverDriveClient(object):
         # in format["identifiers"]
         # format["isbn"] reflects the "LibraryISBN" value
 
-        if not format_types:
-            # use any
-            format_types = [f["id"] for f in formats]
-        isbn = next(
-            iter(
-                [
-                    f["isbn"]
-                    for f in formats
-                    if f.get("isbn") and f["id"] in format_types
-                ]
-            ),
-            "",
-        )
-        if isbn:
-            return isbn
-
-        for isbn_type in ("LibraryISBN", "ISBN"):
-            for media_format in [
-                f
-                for f in formats
-                if f["id"] in format_types
-                and [i for i in f.get("identifiers", []) if i["type"] == isbn_type]
-            ]:
-                isbn = next(
-                    iter(
-                        [
-                            identifier["value"]
-                            for identifier in media_format.get("identifiers", [])
-                            if identifier["type"] == isbn_type
-                        ]
-                    ),
-                    "",
-                )
-                if isbn:
-                    return isbn
+        # if no format_types, use any
+        format_types_set = set(format_types) if format_types else None
+        for media_format in formats:
+            if media_format.get("isbn") and (
+                format_types_set is None or media_format["id"] in format_types_set
+            ):
+                return media_format["isbn"]
+
+        # "LibraryISBN" is preferred over "ISBN" in any format
+        fallback_isbn = ""
+        for media_format in formats:
+            if (
+                format_types_set is not None
+                and media_format["id"] not in format_types_set
+            ):
+                continue
+            for identifier in media_format.get("identifiers", []):
+                if not identifier.get("value"):
+                    continue
+                if identifier["type"] == "LibraryISBN":
+                    return identifier["value"]
+                if identifier["type"] == "ISBN" and not fallback_isbn:
+                    fallback_isbn = identifier["value"]
 
-        return ""
+        return fallback_isbn
 
     @staticmethod
     def extract_type(media) -> str:
@@ -431,7 +630,7 @@ class OverDriveClient(object):
         params.update(kwargs)
         return self.send_request("media/bulk", query=params)
 
-    @pageable
+    @pageable(page_size=MAX_PAGEABLE)
     def libraries(
         self, website_ids: Optional[List[Union[int, str]]] = None, **kwargs
     ) -> Dict:
@@ -442,7 +641,7 @@ class OverDriveClient(object):
         :param kwargs:
             - websiteId: A unique id that identifies the library
             - libraryKeys: Comma-separated list of library keys to get the information for.
-            - perPage: The number of items to return per page, up to a max of 100 (defaults to 24)
+            - perPage: The number of items to return per page, up to a max of 100 (defaults to 100)
             - page: The current page being requested (defaults to 1)
         :return:
         """
@@ -470,24 +669,20 @@ class OverDriveClient(object):
         )
 
     @staticmethod
-    def sort_availabilities(a, b):
-        for key, default, fn in [
-            ("isAvailable", False, None),
-            ("luckyDayAvailableCopies", 0, None),
-            ("estimatedWaitDays", 9999, lambda v: -1 * v),
-            ("holdsRatio", 9999, lambda v: -1 * v),
-            ("ownedCopies", 0, None),
-        ]:
-            value_a = a.get(key, default)
-            value_b = b.get(key, default)
-            if fn:
-                value_a = fn(value_a)
-                value_b = fn(value_b)
-            if value_a > value_b:
-                return 1
-            if value_a < value_b:
-                return -1
-        return 0
+    def availability_sort_key(availability: Dict) -> Tuple:
+        """
+        Sort key for library availabilities, best availability first.
+
+        :param availability:
+        :return:
+        """
+        return (
+            not availability.get("isAvailable", False),
+            -availability.get("luckyDayAvailableCopies", 0),
+            availability.get("estimatedWaitDays", 9999),
+            availability.get("holdsRatio", 9999),
+            -availability.get("ownedCopies", 0),
+        )
 
     def media_search(self, library_keys: List[str], query: str, **kwargs) -> List[Dict]:
         """
@@ -548,3 +743,27 @@ class OverDriveClient(object):
             params=params,
             is_form=False,
         )
+
+    def availability_for_libraries(
+        self, library_keys: List[str], title_ids: List[str], max_workers: int = 4
+    ) -> Dict[str, Dict]:
+        """
+        Check availability for list of title IDs at multiple libraries concurrently
+
+        :param library_keys:
+        :param title_ids:
+        :param max_workers: Max number of concurrent requests
+        :return: Dict of library key to the library_media_availability_bulk() result
+        """
+        if not library_keys:
+            return {}
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(library_keys)))
+        ) as executor:
+            results = executor.map(
+                lambda library_key: self.library_media_availability_bulk(
+                    library_key, title_ids
+                ),
+                library_keys,
+            )
+            return dict(zip(library_keys, results))
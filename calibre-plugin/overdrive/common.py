@@ -14,29 +14,36 @@ from functools import wraps
 MAX_PAGEABLE = 100
 
 
-def pageable(fn: Callable):
+def pageable(page_size: int = 0):
     """
-    Indicates that the function supports paging, and validates the pageSize keyword
-    argument.
+    Indicates that the function supports paging, and validates the page and perPage keyword
+    arguments.
 
-    :param fn:
+    :param page_size: Default perPage value if not specified by the caller
     :return:
     """
+    if page_size > MAX_PAGEABLE:
+        raise ValueError(f"page_size cannot be greater than {MAX_PAGEABLE}")
 
-    @wraps(fn)
-    def wrapper(*args, **kwargs):
-        page = kwargs.get("page")
-        if page is not None:
-            if page <= 0:
-                raise ValueError("page must be a positive int")
-            kwargs["page"] = int(page)
-        per_page = kwargs.get("perPage")
-        if per_page is not None:
-            if per_page > MAX_PAGEABLE:
-                raise ValueError(f"perPage cannot be greater than {MAX_PAGEABLE}")
-            if per_page <= 0:
-                raise ValueError("perPage must be a positive int")
-            kwargs["perPage"] = int(per_page)
-        return fn(*args, **kwargs)
-
-    return wrapper
+    def decorator(fn: Callable):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            page = kwargs.get("page")
+            if page is not None:
+                if page <= 0:
+                    raise ValueError("page must be a positive int")
+                kwargs["page"] = int(page)
+            per_page = kwargs.get("perPage")
+            if per_page is None and page_size:
+                per_page = page_size
+            if per_page is not None:
+                if per_page > MAX_PAGEABLE:
+                    raise ValueError(f"perPage cannot be greater than {MAX_PAGEABLE}")
+                if per_page <= 0:
+                    raise ValueError("perPage must be a positive int")
+                kwargs["perPage"] = int(per_page)
+            return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -11,10 +11,11 @@ import json
 import logging
 import sys
 import unittest
-from http.client import HTTPConnection
+from http.client import HTTPConnection, HTTPMessage
 from io import BytesIO
 from typing import Dict, Optional
 from urllib.error import HTTPError
+from urllib.response import addinfourl
 
 test_logger = logging.getLogger(__name__)
 test_logger.setLevel(logging.WARNING)
@@ -51,3 +52,21 @@ class MockHTTPError(HTTPError):
         super().__init__(
             url, code, msg, headers, BytesIO(json.dumps(res_obj).encode("ascii"))
         )
+
+
+class MockHTTPResponse(addinfourl):
+    def __init__(
+        self,
+        code: int,
+        res_obj: Dict,
+        url: str = "",
+        headers: Optional[Dict] = None,
+    ):
+        if not headers:
+            headers = {"content-type": "application/json"}
+        message = HTTPMessage()
+        for k, v in headers.items():
+            message[k] = v
+        super().__init__(
+            BytesIO(json.dumps(res_obj).encode("ascii")), message, url, code
+        )
@@ -7,11 +7,20 @@
 # See https://github.com/ping/libby-calibre-plugin for more
 # information
 #
+import gzip
 import math
-from functools import cmp_to_key
+import unittest
+from unittest.mock import patch
+from urllib.error import HTTPError
 
 from overdrive import LibraryMediaSearchParams, OverDriveClient
-from .base import BaseTests
+from overdrive.common import MAX_PAGEABLE, pageable
+from .base import BaseTests, MockHTTPError, MockHTTPResponse
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
 
 
 class OverDriveClientTests(BaseTests):
@@ -169,6 +178,26 @@ class OverDriveClientTests(BaseTests):
 
         self.assertEqual(len(all_library_keys), len(libraries))
 
+    def test_pageable(self):
+        @pageable(page_size=50)
+        def paged(**kwargs):
+            return kwargs
+
+        @pageable()
+        def unpaged(**kwargs):
+            return kwargs
+
+        self.assertEqual(paged(), {"perPage": 50})
+        self.assertEqual(paged(page=2, perPage=10), {"page": 2, "perPage": 10})
+        self.assertEqual(unpaged(), {})
+        self.assertEqual(unpaged(perPage=MAX_PAGEABLE), {"perPage": MAX_PAGEABLE})
+        for kwargs in ({"page": 0}, {"perPage": 0}, {"perPage": MAX_PAGEABLE + 1}):
+            with self.subTest("invalid paging", kwargs=kwargs):
+                with self.assertRaises(ValueError):
+                    paged(**kwargs)
+        with self.assertRaises(ValueError):
+            pageable(page_size=MAX_PAGEABLE + 1)
+
     def test_media_bulk(self):
         title_ids = ["9945849", "9954663", "9963571"]
         titles = self.client.media_bulk(title_ids=title_ids)
@@ -180,7 +209,7 @@ class OverDriveClientTests(BaseTests):
             with self.subTest("library media response", k=k):
                 self.assertTrue(title.get(k))
 
-    def test_sort_availabilities(self):
+    def test_availability_sort_key(self):
         for a, b in [
             (
                 {"id": "a", "isAvailable": True, "estimatedWaitDays": 1},
@@ -230,11 +259,7 @@ class OverDriveClientTests(BaseTests):
                 {"id": "b", "isAvailable": False, "estimatedWaitDays": 3},
             ),
         ]:
-            results = sorted(
-                [a, b],
-                key=cmp_to_key(OverDriveClient.sort_availabilities),
-                reverse=True,
-            )
+            results = sorted([b, a], key=OverDriveClient.availability_sort_key)
             self.assertEqual(results[0]["id"], "a")
 
     def test_media_search(self):
@@ -249,9 +274,7 @@ class OverDriveClientTests(BaseTests):
             for k, v in media.get("siteAvailabilities", {}).items():
                 v["advantageKey"] = k
                 sites.append(v)
-            sites = sorted(
-                sites, key=cmp_to_key(OverDriveClient.sort_availabilities), reverse=True
-            )
+            sites = sorted(sites, key=OverDriveClient.availability_sort_key)
             self.assertTrue(media["title"])
             self.assertTrue(sites[0]["advantageKey"])
 
@@ -304,6 +327,17 @@ class OverDriveClientTests(BaseTests):
             OverDriveClient.extract_isbn(formats, ["ebook-epub-adobe"]), "9780000000000"
         )
         self.assertEqual(OverDriveClient.extract_isbn(formats, []), "9780000000000")
+        formats = [
+            {
+                "identifiers": [{"value": "9780000000000", "type": "ISBN"}],
+                "id": "ebook-kindle",
+            },
+            {
+                "identifiers": [{"value": "9780000000001", "type": "LibraryISBN"}],
+                "id": "ebook-epub-adobe",
+            },
+        ]
+        self.assertEqual(OverDriveClient.extract_isbn(formats, []), "9780000000001")
 
     def test_extract_asin(self):
         formats = [
@@ -317,6 +351,33 @@ class OverDriveClientTests(BaseTests):
         ]
         self.assertEqual(OverDriveClient.extract_asin(formats), "B123456789")
 
+    def test_get_best_cover_url(self):
+        media = {
+            "covers": {
+                "cover150Wide": {"href": "https://example.com/150.jpg", "width": 150},
+                "cover510Wide": {"href": "https://example.com/510.jpg", "width": 510},
+                "cover300Wide": {"href": "https://example.com/300.jpg", "width": 300},
+            }
+        }
+        self.assertEqual(
+            OverDriveClient.get_best_cover_url(media), "https://example.com/510.jpg"
+        )
+        self.assertEqual(
+            OverDriveClient.get_best_cover_url(media, rank=1),
+            "https://example.com/300.jpg",
+        )
+        self.assertIsNone(OverDriveClient.get_best_cover_url(media, rank=3))
+        self.assertEqual(
+            OverDriveClient.get_best_cover_url(media, rank=-1),
+            "https://example.com/150.jpg",
+        )
+        self.assertEqual(
+            OverDriveClient.get_best_cover_url(media, rank=-2),
+            "https://example.com/300.jpg",
+        )
+        self.assertIsNone(OverDriveClient.get_best_cover_url(media, rank=-4))
+        self.assertIsNone(OverDriveClient.get_best_cover_url({}))
+
     def test_library_media_availability(self):
         item = self.client.library_media_availability("lapl", "784353")
         for k in (
@@ -367,9 +428,192 @@ class OverDriveClientTests(BaseTests):
                     with self.subTest("item", k=k):
                         self.assertIn(k, item, msg=f'"{k}" not found')
 
+    def test_availability_for_libraries(self):
+        library_keys = ["lapl", "sno-isle"]
+        res = self.client.availability_for_libraries(library_keys, ["784353", "36635"])
+        self.assertEqual(list(res.keys()), library_keys)
+        for library_key in library_keys:
+            with self.subTest("library", library_key=library_key):
+                self.assertTrue(res[library_key].get("items"))
+
+    @unittest.skipUnless(urllib3, "urllib3 is not installed")
+    @patch("urllib.request.OpenerDirector.open")
+    def test_pooled_requests(self, open_mock):
+        client = OverDriveClient(max_retries=0, timeout=15, logger=self.logger)
+        self.assertIsNotNone(client._pool)
+
+        with patch.object(client._pool, "urlopen") as urlopen_mock:
+            urlopen_mock.side_effect = [
+                urllib3.HTTPResponse(
+                    body=gzip.compress(b'{"id": "284716"}'),
+                    headers={
+                        "content-type": "application/json",
+                        "Content-Encoding": "gzip",
+                    },
+                    status=200,
+                    preload_content=True,
+                    decode_content=False,
+                ),
+                urllib3.HTTPResponse(
+                    body=b'{"errorCode": "NotFound"}',
+                    headers={"content-type": "application/json"},
+                    status=404,
+                    reason="Not Found",
+                    preload_content=True,
+                ),
+                urllib3.HTTPResponse(
+                    body=b"",
+                    headers={"Location": "https://example.com/media/284716"},
+                    status=302,
+                    preload_content=True,
+                ),
+            ]
+            open_mock.return_value = MockHTTPResponse(200, {"id": "284716"})
+
+            self.assertEqual(client.media("284716"), {"id": "284716"})
+            self.assertEqual(
+                urlopen_mock.call_args[0],
+                ("GET", "/v2/media/284716?x-client-id=dewey"),
+            )
+            open_mock.assert_not_called()
+
+            with self.assertRaises(HTTPError) as context:
+                client.media("000000")
+            self.assertEqual(context.exception.code, 404)
+            open_mock.assert_not_called()
+
+            # redirects are followed by the urllib opener
+            self.assertEqual(client.media("284716"), {"id": "284716"})
+            open_mock.assert_called_once()
+
+    @patch("urllib.request.OpenerDirector.open")
+    def test_http_cache(self, open_mock):
+        client = OverDriveClient(
+            max_retries=0, timeout=15, logger=self.logger, http_cache_capacity=1
+        )
+        client._pool = None  # use the urllib opener
+
+        def sent_header(name):
+            return open_mock.call_args[0][0].get_header(name)
+
+        validator_headers = {
+            "content-type": "application/json",
+            "ETag": '"v1"',
+            "Last-Modified": "Wed, 01 Nov 2023 00:00:00 GMT",
+        }
+        open_mock.side_effect = [
+            MockHTTPResponse(200, {"id": "1"}, headers=validator_headers),
+            MockHTTPError(304, {}),
+            MockHTTPError(304, {}),
+            MockHTTPResponse(200, {"id": "1"}),
+            MockHTTPResponse(200, {"id": "2"}, headers=validator_headers),
+            MockHTTPResponse(200, {"id": "1"}),
+            MockHTTPResponse(200, {"id": "2"}),
+            MockHTTPResponse(200, {"id": "2"}),
+        ]
+
+        res = client.media("1")
+        self.assertIsNone(sent_header("If-none-match"))
+        res["id"] = "modified"
+
+        # 304 returns the cached response
+        self.assertEqual(client.media("1"), {"id": "1"})
+        self.assertEqual(sent_header("If-none-match"), '"v1"')
+        self.assertEqual(
+            sent_header("If-modified-since"), "Wed, 01 Nov 2023 00:00:00 GMT"
+        )
+
+        # caller's headers are not modified
+        headers = client.default_headers()
+        self.assertEqual(
+            client.send_request(
+                "media/1", query=client.default_query(), headers=headers
+            ),
+            {"id": "1"},
+        )
+        self.assertEqual(sent_header("If-none-match"), '"v1"')
+        self.assertNotIn("If-None-Match", headers)
+        self.assertNotIn("If-Modified-Since", headers)
+
+        client.send_request("media/1", query=client.default_query(), use_cache=False)
+        self.assertIsNone(sent_header("If-none-match"))
+
+        # capacity exceeded, media/1 is evicted
+        client.media("2")
+        client.media("1")
+        self.assertIsNone(sent_header("If-none-match"))
+
+        # a response without validators evicts the cached media/2
+        client.media("2")
+        self.assertEqual(sent_header("If-none-match"), '"v1"')
+        client.media("2")
+        self.assertIsNone(sent_header("If-none-match"))
+
+        # cache disabled
+        client = OverDriveClient(
+            max_retries=0, timeout=15, logger=self.logger, http_cache_capacity=0
+        )
+        client._pool = None
+        open_mock.side_effect = [
+            MockHTTPResponse(200, {"id": "1"}, headers=validator_headers),
+            MockHTTPResponse(200, {"id": "1"}, headers=validator_headers),
+        ]
+        client.media("1")
+        client.media("1")
+        self.assertIsNone(sent_header("If-none-match"))
+
+    @unittest.skipUnless(urllib3, "urllib3 is not installed")
+    def test_pooled_http_cache(self):
+        client = OverDriveClient(max_retries=0, timeout=15, logger=self.logger)
+        with patch.object(client._pool, "urlopen") as urlopen_mock:
+            urlopen_mock.side_effect = [
+                urllib3.HTTPResponse(
+                    body=b'{"id": "1"}',
+                    headers={"content-type": "application/json", "ETag": '"v1"'},
+                    status=200,
+                    preload_content=True,
+                ),
+                urllib3.HTTPResponse(
+                    body=b"", headers={"ETag": '"v1"'}, status=304, preload_content=True
+                ),
+            ]
+            client.media("1")
+            self.assertNotIn("If-none-match", urlopen_mock.call_args[1]["headers"])
+            self.assertEqual(client.media("1"), {"id": "1"})
+            self.assertEqual(
+                urlopen_mock.call_args[1]["headers"]["If-none-match"], '"v1"'
+            )
+
     def test_library_medias(self):
         query = LibraryMediaSearchParams(title_ids=["784353", "36635", "000000"])
         res = self.client.library_medias("lapl", query)
         self.assertEqual(len(res.get("items", [])), 2)  # one of the IDs is invalid
         for item in res.get("items", []):
             self.assertIn(item["id"], query.title_ids)
+
+    def test_library_media_search_params(self):
+        self.assertEqual(
+            LibraryMediaSearchParams().to_dict(),
+            {"page": 1, "perPage": 20, "sortBy": "relevance"},
+        )
+        query = LibraryMediaSearchParams(
+            query=" harry potter ",
+            formats=["ebook-epub-adobe", "ebook-kindle"],
+            show_only_available=True,
+            show_only_prelease=True,
+            title_ids=["784353", "36635"],
+        )
+        self.assertEqual(
+            query.to_dict(),
+            {
+                "page": 1,
+                "perPage": 20,
+                "sortBy": "relevance",
+                "format": "ebook-epub-adobe,ebook-kindle",
+                "showOnlyAvailable": "true",
+                "query": "harry potter",
+                "titleIds": "784353,36635",
+            },
+        )
+        self.assertFalse(query.is_empty())
+        self.assertTrue(LibraryMediaSearchParams().is_empty())